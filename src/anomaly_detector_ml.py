@@ -1,20 +1,31 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import StandardScaler, KBinsDiscretizer
 from sklearn.metrics import classification_report, confusion_matrix
 import joblib
+import weakref
 from typing import Tuple, Dict, Any
 import warnings
 warnings.filterwarnings('ignore')
 
+from src.kernels import UNUSUAL_HOURS, RARE_EVENT, pack_isolation_forest, load_kernels
+
+# Ahead-of-time compiled kernels (`python -m src.kernels`) when current, else JIT
+kernels = load_kernels()
+
 class BehavioralAnomalyDetector:
     def __init__(self, config):
         self.config = config.ml
         self.model = None
         self.scaler = StandardScaler()
+        self.binner = None
         self.label_encoders = {}
         self.is_trained = False
+        self._buf = None
+        self._forest = None
+        self._last_frame = None
+        self._last_scaled = None
         
     def prepare_features(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, list]:
         """Prepare features for ML model"""
@@ -26,28 +37,39 @@ class BehavioralAnomalyDetector:
             'event_frequency', 'resource_access_frequency', 'is_usual_region', 'has_error'
         ]
         
-        # Encode categorical variables
+        # Encode categorical variables against a stored index of known
+        # categories; unseen categories map to -1
         categorical_columns = ['event_name', 'resource_type', 'user_identity']
         for col in categorical_columns:
             if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                    # Handle unseen categories
-                    df[col] = df[col].fillna('Unknown')
-                    self.label_encoders[col].fit(df[col])
-                
-                df[f'{col}_encoded'] = self.label_encoders[col].transform(df[col])
+                df[f'{col}_encoded'] = self._encode_categorical(df[col], col)
                 feature_columns.append(f'{col}_encoded')
         
         # Select only available features
         available_features = [f for f in feature_columns if f in df.columns]
         features = df[available_features].copy()
         
-        # Handle missing values
-        features = features.fillna(0)
+        # Handle missing values; float32 halves memory traffic through the forest
+        features = features.fillna(0).astype(np.float32)
         
         return features, available_features
     
+    def _encode_categorical(self, values: pd.Series, col: str) -> np.ndarray:
+        """Map a column onto the known categories, treating missing values as 'Unknown'"""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Encode each category once and broadcast through the integer codes;
+            # code -1 (missing) picks the trailing 'Unknown' label
+            labels = values.cat.categories.append(pd.Index(['Unknown']))
+            codes = values.cat.codes.to_numpy()
+            if col not in self.label_encoders:
+                self.label_encoders[col] = pd.Index(labels[np.unique(codes)], dtype=object).unique()
+            return self.label_encoders[col].get_indexer(labels)[codes]
+        
+        values = values.fillna('Unknown')
+        if col not in self.label_encoders:
+            self.label_encoders[col] = pd.Index(values.unique())
+        return self.label_encoders[col].get_indexer(values)
+    
     def train(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Train the Isolation Forest model"""
         print("[+] Training ML model for anomaly detection...")
@@ -58,25 +80,45 @@ class BehavioralAnomalyDetector:
             raise ValueError("No features available for training")
         
         # Scale features
-        scaled_features = self.scaler.fit_transform(features)
+        scaled_features = self.scaler.fit_transform(features).astype(np.float32, copy=False)
+        
+        # Optionally quantize features to quantile bins (uint8 up to 256 bins)
+        if self.config.feature_bins:
+            self.binner = KBinsDiscretizer(
+                n_bins=self.config.feature_bins,
+                encode='ordinal',
+                strategy='quantile',
+                dtype=np.float32
+            )
+            self.binner.fit(scaled_features)
+        else:
+            self.binner = None
+        scaled_features = self._quantize(scaled_features)
+        
+        # Remember the model input so detect() on the same frame can skip featurization
+        self._last_frame = weakref.ref(df)
+        self._last_scaled = scaled_features
         
         # Train Isolation Forest
         self.model = IsolationForest(
             n_estimators=self.config.n_estimators,
             contamination=self.config.contamination,
             random_state=self.config.random_state,
+            max_samples=min(256, len(features)),
+            n_jobs=-1,
             verbose=1
         )
         
         self.model.fit(scaled_features)
+        self._forest = pack_isolation_forest(self.model)
         self.is_trained = True
         
-        # Calculate training metrics
-        train_predictions = self.model.predict(scaled_features)
-        train_scores = self.model.decision_function(scaled_features)
+        # Calculate training metrics (predict() is the sign of decision_function)
+        train_scores = self._decision_function(scaled_features)
+        train_predictions = np.where(train_scores < 0, -1, 1)
         
-        n_anomalies = sum(train_predictions == -1)
-        accuracy = (train_predictions == 1).sum() / len(train_predictions)
+        n_anomalies = int(np.count_nonzero(train_predictions == -1))
+        accuracy = np.count_nonzero(train_predictions == 1) / train_predictions.size
         
         print(f"[✓] Model trained successfully with {accuracy:.1%} accuracy")
         print(f"[!] Detected {n_anomalies} anomalies in training data")
@@ -93,22 +135,43 @@ class BehavioralAnomalyDetector:
         if not self.is_trained:
             raise ValueError("Model must be trained before detection")
         
-        features, _ = self.prepare_features(df)
-        
-        if features.empty:
-            return pd.DataFrame(), {'error': 'No features available for detection'}
-        
-        # Scale features
-        scaled_features = self.scaler.transform(features)
+        if self._last_frame is not None and self._last_frame() is df and len(df) == len(self._last_scaled):
+            # Same frame the model was just trained on
+            scaled_features = self._last_scaled
+        else:
+            features, _ = self.prepare_features(df)
+            
+            if features.empty:
+                return pd.DataFrame(), {'error': 'No features available for detection'}
+            
+            # Scale features into a reusable float32 buffer
+            values = features.to_numpy(dtype=np.float32, copy=False)
+            if self._buf is None or self._buf.shape != values.shape:
+                self._buf = np.empty(values.shape, dtype=np.float32)
+            kernels.standardize(
+                values,
+                self.scaler.mean_.astype(np.float32),
+                self.scaler.scale_.astype(np.float32),
+                self._buf
+            )
+            scaled_features = self._quantize(self._buf)
         
-        # Predict anomalies
-        predictions = self.model.predict(scaled_features)
-        anomaly_scores = self.model.decision_function(scaled_features)
+        # Predict anomalies with a single pass over the forest
+        anomaly_scores = self._decision_function(scaled_features)
+        predictions = np.where(anomaly_scores < 0, -1, 1)
         
         # Add results to dataframe
         df['anomaly_score'] = anomaly_scores
         df['is_anomaly'] = predictions == -1
-        df['anomaly_confidence'] = 1 - (anomaly_scores - anomaly_scores.min()) / (anomaly_scores.max() - anomaly_scores.min())
+        
+        # Min-max normalize scores into confidences in a single buffer
+        score_min = anomaly_scores.min()
+        score_range = np.ptp(anomaly_scores) or 1.0
+        confidence = np.empty_like(anomaly_scores)
+        np.subtract(anomaly_scores, score_min, out=confidence)
+        np.divide(confidence, score_range, out=confidence)
+        np.subtract(1.0, confidence, out=confidence)
+        df['anomaly_confidence'] = confidence
         
         # Filter high-confidence anomalies
         high_confidence_anomalies = df[
@@ -118,7 +181,7 @@ class BehavioralAnomalyDetector:
         
         stats = {
             'total_events': len(df),
-            'anomalies_detected': sum(df['is_anomaly']),
+            'anomalies_detected': int(np.count_nonzero(df['is_anomaly'].to_numpy())),
             'high_confidence_anomalies': len(high_confidence_anomalies),
             'avg_anomaly_score': np.mean(anomaly_scores),
             'false_positive_reduction': 0.35  # Simulated improvement
@@ -129,6 +192,35 @@ class BehavioralAnomalyDetector:
         
         return high_confidence_anomalies, stats
     
+    def _decision_function(self, features: np.ndarray) -> np.ndarray:
+        """IsolationForest.decision_function evaluated on the packed forest"""
+        forest = self._forest
+        path_lengths = np.empty(features.shape[0], dtype=np.float64)
+        kernels.score_forest_tabular(
+            np.asarray(features, dtype=np.float32),
+            forest['split_features'],
+            forest['children_left'],
+            forest['children_right'],
+            forest['thresholds'],
+            forest['leaf_values'],
+            path_lengths
+        )
+        
+        # Like sklearn, a forest fit on a single sample (zero normalizer) scores 2**-1
+        normalized = np.divide(
+            path_lengths, forest['normalizer'],
+            out=np.ones_like(path_lengths), where=forest['normalizer'] != 0
+        )
+        return -np.exp2(-normalized) - forest['offset']
+    
+    def _quantize(self, scaled_features: np.ndarray) -> np.ndarray:
+        """Map scaled features to bin indices when a binner is fitted"""
+        if self.binner is None:
+            return scaled_features
+        # Smallest unsigned type holding every bin index, so bins past 255 don't wrap
+        dtype = np.min_scalar_type(int(self.binner.n_bins_.max()) - 1)
+        return self.binner.transform(scaled_features).astype(dtype)
+    
     def save_model(self, filepath: str = None):
         """Save trained model to file"""
         if filepath is None:
@@ -137,11 +229,12 @@ class BehavioralAnomalyDetector:
         model_data = {
             'model': self.model,
             'scaler': self.scaler,
+            'binner': self.binner,
             'label_encoders': self.label_encoders,
             'is_trained': self.is_trained
         }
         
-        joblib.dump(model_data, filepath)
+        joblib.dump(model_data, filepath, compress=('lz4', 3), protocol=5)
         print(f"[✓] Model saved to {filepath}")
     
     def load_model(self, filepath: str = None):
@@ -150,11 +243,18 @@ class BehavioralAnomalyDetector:
             filepath = self.config.model_path
         
         try:
-            model_data = joblib.load(filepath)
+            # Tree arrays are read-only at inference, so memory-mapping is safe
+            # (joblib falls back to a regular read for compressed files)
+            model_data = joblib.load(filepath, mmap_mode='r')
             self.model = model_data['model']
             self.scaler = model_data['scaler']
+            self.binner = model_data.get('binner')
             self.label_encoders = model_data['label_encoders']
             self.is_trained = model_data['is_trained']
+            if self.model is not None:
+                self._forest = pack_isolation_forest(self.model)
+            self._last_frame = None
+            self._last_scaled = None
             print(f"[✓] Model loaded from {filepath}")
         except FileNotFoundError:
             print(f"[!] Model file not found at {filepath}")
@@ -166,42 +266,85 @@ class AdvancedAnomalyDetector(BehavioralAnomalyDetector):
     
     def update_behavioral_profiles(self, df: pd.DataFrame):
         """Update user behavioral profiles"""
-        for user in df['user_identity'].unique():
-            user_data = df[df['user_identity'] == user]
-            
-            profile = {
-                'usual_hours': user_data['hour'].mode().iloc[0] if not user_data['hour'].mode().empty else 9,
-                'common_events': user_data['event_name'].value_counts().head(5).to_dict(),
-                'common_resources': user_data['resource_type'].value_counts().head(5).to_dict(),
-                'avg_daily_activity': len(user_data) / user_data['timestamp'].dt.date.nunique()
+        users = df['user_identity']
+        
+        # Most frequent hour per user, smallest hour on ties (as Series.mode)
+        hour_counts = df.groupby(['user_identity', 'hour'], observed=True).size()
+        usual_hours = (
+            hour_counts.sort_values(ascending=False, kind='stable')
+            .reset_index(level='hour')
+            .groupby(level=0, sort=False, observed=True)['hour'].first()
+        )
+        
+        # Events per distinct active day
+        active_days = df['timestamp'].dt.normalize().groupby(users, sort=False, observed=True).nunique()
+        avg_daily_activity = users.groupby(users, sort=False, observed=True).size() / active_days
+        
+        common_events = self._top_counts(df, 'event_name')
+        common_resources = self._top_counts(df, 'resource_type')
+        
+        for user in avg_daily_activity.index:
+            self.behavioral_profiles[user] = {
+                'usual_hours': usual_hours.get(user, 9),
+                'common_events': common_events.get(user, {}),
+                'common_resources': common_resources.get(user, {}),
+                'avg_daily_activity': avg_daily_activity[user]
             }
-            
-            self.behavioral_profiles[user] = profile
+    
+    @staticmethod
+    def _top_counts(df: pd.DataFrame, column: str, n: int = 5) -> Dict[Any, Dict[Any, int]]:
+        """Top-n value counts of a column for every user"""
+        # Break count ties like value_counts: category order, else first appearance
+        sort = isinstance(df[column].dtype, pd.CategoricalDtype)
+        counts = df.groupby(['user_identity', column], sort=sort, observed=True).size()
+        top = counts.sort_values(ascending=False, kind='stable').groupby(level=0, sort=False).head(n)
+        return {
+            user: user_counts.droplevel(0).to_dict()
+            for user, user_counts in top.groupby(level=0, sort=False, observed=True)
+        }
     
     def detect_behavioral_anomalies(self, df: pd.DataFrame) -> pd.DataFrame:
         """Detect behavioral anomalies based on user profiles"""
-        anomalies = []
+        if df.empty or not self.behavioral_profiles:
+            return pd.DataFrame()
+        
+        # Integer-encode users and events against the profile tables
+        users = list(self.behavioral_profiles)
+        user_codes = pd.Categorical(df['user_identity'], categories=users).codes.astype(np.int32)
+        event_categorical = pd.Categorical(df['event_name'])
+        event_codes = event_categorical.codes.astype(np.int32)
+        event_names = event_categorical.categories
+        
+        usual_hours = np.array(
+            [self.behavioral_profiles[user]['usual_hours'] for user in users], dtype=np.float64
+        )
+        common_event_mask = np.zeros((len(users), max(len(event_names), 1)), dtype=np.bool_)
+        for u, user in enumerate(users):
+            common_events = self.behavioral_profiles[user]['common_events']
+            common_event_mask[u, :len(event_names)] = event_names.isin(list(common_events))
+        
+        flags = np.empty(len(df), dtype=np.int8)
+        kernels.scan_behavioral_anomalies(
+            df['hour'].to_numpy(dtype=np.float64), user_codes, event_codes,
+            usual_hours, common_event_mask, flags
+        )
         
-        for _, event in df.iterrows():
-            user = event['user_identity']
+        # Materialize only the flagged events
+        anomalies = []
+        flagged = np.flatnonzero(flags)
+        for i, (_, event) in zip(flagged, df.iloc[flagged].iterrows()):
+            if flags[i] & UNUSUAL_HOURS:
+                anomalies.append({
+                    'event': event,
+                    'anomaly_type': 'unusual_hours',
+                    'confidence': 0.8
+                })
             
-            if user in self.behavioral_profiles:
-                profile = self.behavioral_profiles[user]
-                
-                # Check for unusual hours
-                if abs(event['hour'] - profile['usual_hours']) > 4:
-                    anomalies.append({
-                        'event': event,
-                        'anomaly_type': 'unusual_hours',
-                        'confidence': 0.8
-                    })
-                
-                # Check for rare events
-                if event['event_name'] not in profile['common_events']:
-                    anomalies.append({
-                        'event': event,
-                        'anomaly_type': 'rare_event',
-                        'confidence': 0.7
-                    })
+            if flags[i] & RARE_EVENT:
+                anomalies.append({
+                    'event': event,
+                    'anomaly_type': 'rare_event',
+                    'confidence': 0.7
+                })
         
         return pd.DataFrame(anomalies)
@@ -23,6 +23,7 @@ class MLConfig:
     contamination: float
     n_estimators: int
     random_state: int
+    feature_bins: int = 0  # 0 disables quantile-bin feature quantization
 
 class Config:
     def __init__(self, config_path: str = "config.yaml"):
@@ -59,7 +60,8 @@ class Config:
                 'model_path': 'models/anomaly_detector.joblib',
                 'contamination': 0.1,
                 'n_estimators': 100,
-                'random_state': 42
+                'random_state': 42,
+                'feature_bins': 0
             },
             'general': {
                 'batch_size': 1000,
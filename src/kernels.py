@@ -0,0 +1,164 @@
+import os
+import sys
+import hashlib
+import numpy as np
+from numba import njit, prange
+from typing import Dict, Any
+
+# Behavioral anomaly flags written by scan_behavioral_anomalies
+UNUSUAL_HOURS = 1
+RARE_EVENT = 2
+
+# Numba type signatures for the ahead-of-time compiled cti_kernels module
+SIGNATURES = {
+    'scan_behavioral_anomalies': 'void(f8[:], i4[:], i4[:], f8[:], b1[:,:], i1[:])',
+    'standardize': 'void(f4[:,:], f4[:], f4[:], f4[:,:])',
+    'score_forest_tabular': 'void(f4[:,:], i8[:,:], i8[:,:], i8[:,:], f8[:,:], f8[:,:], f8[:])',
+    'count_night_and_failures': 'UniTuple(i8, 2)(f8[:], b1[:])'
+}
+
+def _scan_behavioral_anomalies(hours, users, events, usual_hours, common_event_mask, out_flags):
+    """Flag events that deviate from their user's behavioral profile"""
+    for i in prange(hours.shape[0]):
+        user = users[i]
+        flags = 0
+        if user >= 0:
+            # Check for unusual hours
+            if abs(hours[i] - usual_hours[user]) > 4:
+                flags |= UNUSUAL_HOURS
+            
+            # Check for rare events
+            event = events[i]
+            if event < 0 or not common_event_mask[user, event]:
+                flags |= RARE_EVENT
+        out_flags[i] = flags
+
+def _standardize(features, mean, scale, out):
+    """Apply a fitted StandardScaler into a preallocated buffer"""
+    for i in prange(features.shape[0]):
+        for j in range(features.shape[1]):
+            out[i, j] = (features[i, j] - mean[j]) / scale[j]
+
+def _score_forest_tabular(features, split_features, children_left, children_right,
+                          thresholds, leaf_values, out):
+    """Sum per-tree path lengths for a forest packed by pack_isolation_forest"""
+    n_trees = split_features.shape[0]
+    for i in prange(features.shape[0]):
+        total = 0.0
+        for t in range(n_trees):
+            node = 0
+            while children_left[t, node] != -1:
+                if features[i, split_features[t, node]] <= thresholds[t, node]:
+                    node = children_left[t, node]
+                else:
+                    node = children_right[t, node]
+            total += leaf_values[t, node]
+        out[i] = total
+
+def _count_night_and_failures(hours, has_error):
+    """Count midnight-to-5AM events and failed events in one pass"""
+    night = 0
+    failures = 0
+    for i in range(hours.shape[0]):
+        hour = hours[i]
+        if hour >= 0 and hour <= 5:
+            night += 1
+        if has_error[i]:
+            failures += 1
+    return night, failures
+
+# JIT-compiled fallbacks used when cti_kernels has not been built
+scan_behavioral_anomalies = njit(parallel=True, cache=True)(_scan_behavioral_anomalies)
+standardize = njit(parallel=True, fastmath=True, cache=True)(_standardize)
+score_forest_tabular = njit(parallel=True, cache=True)(_score_forest_tabular)
+count_night_and_failures = njit(cache=True)(_count_night_and_failures)
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected isolation depth of a node holding n_samples points"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    n = n_samples[large]
+    lengths[large] = 2.0 * (np.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+    return lengths
+
+def pack_isolation_forest(model) -> Dict[str, Any]:
+    """Flatten a fitted IsolationForest into padded per-tree node tables"""
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    n_trees = len(trees)
+    max_nodes = max(tree.node_count for tree in trees)
+    
+    split_features = np.zeros((n_trees, max_nodes), dtype=np.int64)
+    children_left = np.full((n_trees, max_nodes), -1, dtype=np.int64)
+    children_right = np.full((n_trees, max_nodes), -1, dtype=np.int64)
+    thresholds = np.zeros((n_trees, max_nodes), dtype=np.float64)
+    leaf_values = np.zeros((n_trees, max_nodes), dtype=np.float64)
+    
+    for t, (tree, tree_features) in enumerate(zip(trees, model.estimators_features_)):
+        n = tree.node_count
+        is_split = tree.children_left != -1
+        
+        # Map each tree's feature subset back to the full feature columns
+        split_features[t, :n] = np.where(is_split, np.asarray(tree_features)[tree.feature.clip(0)], 0)
+        children_left[t, :n] = tree.children_left
+        children_right[t, :n] = tree.children_right
+        thresholds[t, :n] = tree.threshold
+        
+        # A leaf contributes its depth plus the expected depth of its subtree
+        depths = np.zeros(n, dtype=np.float64)
+        for node in range(n):
+            if is_split[node]:
+                depths[tree.children_left[node]] = depths[node] + 1
+                depths[tree.children_right[node]] = depths[node] + 1
+        leaf_values[t, :n] = depths + average_path_length(tree.n_node_samples)
+    
+    return {
+        'split_features': split_features,
+        'children_left': children_left,
+        'children_right': children_right,
+        'thresholds': thresholds,
+        'leaf_values': leaf_values,
+        'normalizer': n_trees * average_path_length([model.max_samples_])[0],
+        'offset': model.offset_
+    }
+
+def _source_abi() -> int:
+    """Fingerprint of this file, stamped into cti_kernels to detect stale builds"""
+    with open(os.path.abspath(__file__), 'rb') as source:
+        return int.from_bytes(hashlib.blake2b(source.read(), digest_size=7).digest(), 'little')
+
+KERNEL_ABI = _source_abi()
+
+def load_kernels():
+    """The cti_kernels extension when it was built from this source, else this module"""
+    try:
+        from src import cti_kernels
+    except ImportError:
+        return sys.modules[__name__]
+    
+    # A build from an older kernels.py may lack kernels or have other signatures
+    if not hasattr(cti_kernels, 'kernel_abi') or cti_kernels.kernel_abi() != KERNEL_ABI:
+        print("[!] Ignoring stale cti_kernels build; rebuild with `python -m src.kernels`")
+        return sys.modules[__name__]
+    return cti_kernels
+
+def build(output_dir: str = None):
+    """Ahead-of-time compile the kernels into the cti_kernels extension module"""
+    from numba.pycc import CC
+    
+    cc = CC('cti_kernels')
+    cc.output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+    cc.export('scan_behavioral_anomalies', SIGNATURES['scan_behavioral_anomalies'])(_scan_behavioral_anomalies)
+    cc.export('standardize', SIGNATURES['standardize'])(_standardize)
+    cc.export('score_forest_tabular', SIGNATURES['score_forest_tabular'])(_score_forest_tabular)
+    cc.export('count_night_and_failures', SIGNATURES['count_night_and_failures'])(_count_night_and_failures)
+    
+    # Stamp the build so load_kernels can reject it once kernels.py changes
+    abi = KERNEL_ABI
+    cc.export('kernel_abi', 'i8()')(lambda: abi)
+    cc.compile()
+    print(f"[✓] Compiled cti_kernels into {cc.output_dir}")
+
+if __name__ == "__main__":
+    build()
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from typing import Dict, Any
 import time
 import sys
 import os
@@ -50,16 +51,17 @@ class CloudThreatIntelligencePlatform:
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=24)  # Last 24 hours
         
-        # Collect AWS CloudTrail events
+        # Stream AWS CloudTrail events and Azure activity logs
         aws_events = self.aws_connector.get_events(start_time, end_time)
-        print(f"[✓] Collected {len(aws_events)} AWS CloudTrail events")
-        
-        # Collect Azure activity logs
         azure_events = self.azure_connector.get_activity_logs(start_time, end_time)
-        print(f"[✓] Collected {len(azure_events)} Azure activity logs")
         
-        # Normalize and process events
+        # Normalize events as they are paged in
         normalized_events = self.data_processor.normalize_events(aws_events, azure_events)
+        provider_counts = normalized_events['cloud_provider'].value_counts()
+        print(f"[✓] Collected {provider_counts.get('aws', 0)} AWS CloudTrail events")
+        print(f"[✓] Collected {provider_counts.get('azure', 0)} Azure activity logs")
+        
+        # Process events
         processed_events = self.data_processor.extract_features(normalized_events)
         
         self.stats['total_events_processed'] += len(processed_events)
@@ -100,8 +102,19 @@ class CloudThreatIntelligencePlatform:
         # Step 2: Behavioral anomaly detection
         behavioral_anomalies = self.anomaly_detector.detect_behavioral_anomalies(events)
         
-        # Step 3: Threat analysis
-        all_anomalies = pd.concat([anomalies, behavioral_anomalies], ignore_index=True)
+        # Step 3: Threat analysis on both anomaly sets, aligned to one schema
+        frames = [frame for frame in (anomalies, behavioral_anomalies) if not frame.empty]
+        if not frames:
+            all_anomalies = pd.DataFrame()
+        elif len(frames) == 1:
+            all_anomalies = frames[0]
+        else:
+            columns = anomalies.columns.union(behavioral_anomalies.columns, sort=False)
+            all_anomalies = pd.concat(
+                [frame.reindex(columns=columns) for frame in frames],
+                ignore_index=True,
+                sort=False
+            )
         threat_analysis = self.threat_monitor.monitor_events(all_anomalies)
         
         # Step 4: Generate report
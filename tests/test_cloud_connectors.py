@@ -0,0 +1,104 @@
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from src.cloud_connectors import CloudDataProcessor, FEATURE_COLUMNS
+except ImportError:  # boto3 / azure SDKs not installed
+    CloudDataProcessor = None
+
+@unittest.skipIf(CloudDataProcessor is None, "cloud provider SDKs not installed")
+class TestFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.processor = CloudDataProcessor(feature_cache_size=2)
+    
+    def make_events(self, event_names, index=None):
+        """Build a small raw event batch"""
+        n = len(event_names)
+        return pd.DataFrame({
+            'cloud_provider': ['aws'] * n,
+            'timestamp': ['2024-01-06T03:00:00Z'] * n,
+            'event_name': event_names,
+            'user_identity': ['user1'] * n,
+            'resource_type': ['ec2'] * n,
+            'region': ['us-east-1'] * n,
+            'error_code': [None] * n
+        }, index=index)
+    
+    def test_cache_miss(self):
+        """Test that a new batch gets its features written in place"""
+        events = self.make_events(['CreateUser', 'CreateUser', 'GetObject'])
+        features = self.processor.extract_features(events)
+        
+        self.assertIs(features, events)
+        self.assertEqual(features['event_frequency'].tolist(), [2, 2, 1])
+        self.assertEqual(features['hour'].tolist(), [3, 3, 3])
+        self.assertEqual(len(self.processor._feature_cache), 1)
+    
+    def test_missing_values_count_zero(self):
+        """Test that rows with a missing key get a frequency of 0"""
+        events = self.make_events(['CreateUser', None, None, 'CreateUser'])
+        expected = [2, 0, 0, 2]
+        self.assertEqual(self.processor.extract_features(events)['event_frequency'].tolist(), expected)
+        
+        events = self.make_events(['CreateUser', None, None, 'CreateUser'])
+        events['event_name'] = events['event_name'].astype('category')
+        self.assertEqual(self.processor.extract_features(events)['event_frequency'].tolist(), expected)
+    
+    def test_cache_hit(self):
+        """Test that a repeated batch behaves like a miss on the caller's frame"""
+        expected = self.processor.extract_features(self.make_events(['CreateUser', 'GetObject']))
+        
+        events = self.make_events(['CreateUser', 'GetObject'], index=[10, 20])
+        features = self.processor.extract_features(events)
+        
+        self.assertIs(features, events)
+        self.assertEqual(features.index.tolist(), [10, 20])
+        self.assertEqual(len(self.processor._feature_cache), 1)
+        for col in FEATURE_COLUMNS:
+            np.testing.assert_array_equal(features[col].to_numpy(), expected[col].to_numpy())
+    
+    def test_cache_ignores_non_input_columns(self):
+        """Test that batches differing only in columns the features never read share an entry"""
+        events = self.make_events(['CreateUser', 'GetObject'])
+        events['user_agent'] = ['aws-cli/2.0', 'boto3/1.26']
+        expected = self.processor.extract_features(events)
+        
+        events = self.make_events(['CreateUser', 'GetObject'])
+        events['user_agent'] = ['curl/7.68', 'python-requests/2.28']
+        features = self.processor.extract_features(events)
+        
+        self.assertEqual(len(self.processor._feature_cache), 1)
+        self.assertEqual(features['user_agent'].tolist(), ['curl/7.68', 'python-requests/2.28'])
+        for col in FEATURE_COLUMNS:
+            np.testing.assert_array_equal(features[col].to_numpy(), expected[col].to_numpy())
+    
+    def test_cache_keeps_dtypes(self):
+        """Test that categorical and string batches are cached separately"""
+        self.processor.extract_features(self.make_events(['CreateUser', 'GetObject']))
+        
+        events = self.make_events(['CreateUser', 'GetObject'])
+        events['event_name'] = events['event_name'].astype('category')
+        features = self.processor.extract_features(events)
+        
+        self.assertIsInstance(features['event_name'].dtype, pd.CategoricalDtype)
+        self.assertEqual(len(self.processor._feature_cache), 2)
+    
+    def test_cache_eviction(self):
+        """Test that the least recently used batch is evicted"""
+        batches = [['CreateUser'], ['GetObject'], ['ListBuckets']]
+        fingerprints = [CloudDataProcessor._fingerprint(self.make_events(b)) for b in batches]
+        
+        self.processor.extract_features(self.make_events(batches[0]))
+        self.processor.extract_features(self.make_events(batches[1]))
+        self.processor.extract_features(self.make_events(batches[0]))  # Refresh the first batch
+        self.processor.extract_features(self.make_events(batches[2]))
+        
+        self.assertEqual(list(self.processor._feature_cache), [fingerprints[0], fingerprints[2]])
+
+if __name__ == '__main__':
+    unittest.main()
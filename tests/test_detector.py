@@ -2,13 +2,17 @@ import unittest
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from collections import deque
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from src.anomaly_detector import BehavioralAnomalyDetector
-from src.threat_analyzer import ThreatAnalyzer
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import KBinsDiscretizer
+from src.anomaly_detector import BehavioralAnomalyDetector, AdvancedAnomalyDetector
+from src.kernels import pack_isolation_forest
+from src.threat_analyzer import ThreatAnalyzer, RealTimeThreatMonitor, _ipv4_to_uint32
 from src.config import Config
 
 class TestAnomalyDetector(unittest.TestCase):
@@ -42,6 +46,105 @@ class TestAnomalyDetector(unittest.TestCase):
         
         self.assertIn('anomalies_detected', stats)
         self.assertIsInstance(anomalies, pd.DataFrame)
+    
+    def assert_matches_sklearn(self, model, features):
+        """Assert the packed forest scores features exactly as sklearn does"""
+        self.detector.model = model
+        self.detector._forest = pack_isolation_forest(model)
+        scores = self.detector._decision_function(features)
+        np.testing.assert_allclose(scores, model.decision_function(features), rtol=0, atol=1e-12)
+    
+    def test_decision_function_parity(self):
+        """Test packed forest scoring against IsolationForest.decision_function"""
+        features = np.random.default_rng(0).normal(size=(500, 6)).astype(np.float32)
+        model = IsolationForest(n_estimators=50, max_features=0.5, random_state=0).fit(features)
+        self.assert_matches_sklearn(model, features)
+    
+    def test_decision_function_parity_binned(self):
+        """Test packed forest scoring on quantized features"""
+        features = np.random.default_rng(1).normal(size=(500, 6)).astype(np.float32)
+        self.detector.binner = KBinsDiscretizer(
+            n_bins=16, encode='ordinal', strategy='quantile', dtype=np.float32
+        ).fit(features)
+        binned = self.detector._quantize(features)
+        model = IsolationForest(n_estimators=50, max_features=0.5, random_state=0).fit(binned)
+        self.assert_matches_sklearn(model, binned)
+    
+    def test_quantize_many_bins(self):
+        """Test that bin indices past 255 keep their value"""
+        features = np.random.default_rng(3).normal(size=(2000, 2)).astype(np.float32)
+        self.detector.binner = KBinsDiscretizer(
+            n_bins=512, encode='ordinal', strategy='quantile', dtype=np.float32
+        ).fit(features)
+        binned = self.detector._quantize(features)
+        np.testing.assert_array_equal(binned, self.detector.binner.transform(features))
+        self.assertGreater(binned.max(), 255)
+    
+    def test_decision_function_single_sample(self):
+        """Test that a forest fit on one sample scores like sklearn, not NaN"""
+        features = np.random.default_rng(2).normal(size=(5, 3)).astype(np.float32)
+        model = IsolationForest(n_estimators=10, random_state=0).fit(features[:1])
+        self.assert_matches_sklearn(model, features)
+
+class TestAdvancedAnomalyDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = AdvancedAnomalyDetector(Config())
+    
+    def test_behavioral_anomaly_flags(self):
+        """Test per-event behavioral flags against the user profiles"""
+        self.detector.behavioral_profiles = {
+            'user1': {'usual_hours': 10, 'common_events': {'CreateUser': 3}, 'common_resources': {}}
+        }
+        events = pd.DataFrame({
+            'user_identity': ['user1', 'ghost', 'user1', 'user1', 'user1'],
+            'event_name': ['CreateUser', 'Weird', np.nan, 'CreateUser', 'DeleteUser'],
+            'hour': [10, 3, 10, np.nan, 22]
+        })
+        
+        for frame in (events, events.astype({'user_identity': 'category', 'event_name': 'category'})):
+            anomalies = self.detector.detect_behavioral_anomalies(frame)
+            
+            # Unknown users are skipped, a missing event is rare, a missing hour is not unusual,
+            # and a row with both anomalies reports unusual_hours before rare_event
+            self.assertEqual(
+                anomalies['anomaly_type'].tolist(), ['rare_event', 'unusual_hours', 'rare_event']
+            )
+            self.assertEqual([event.name for event in anomalies['event']], [2, 4, 4])
+    
+    def test_behavioral_profiles_match_per_user_counts(self):
+        """Test that profiles break ties like per-user mode() and value_counts()"""
+        rows = [
+            # user1: hours 3 and 14 tie, Zeta and Alpha tie in first-seen vs. sorted order
+            ('user1', 14, 'Zeta', 's3'), ('user1', 3, 'Alpha', 'ec2'), ('user1', 14, 'Zeta', 's3'),
+            ('user1', 3, 'Alpha', 'ec2'), ('user1', 20, 'Mid', 'iam'),
+            # user2: six events seen once each, so head(5) cuts inside a tie
+            *[('user2', 8, name, 'lambda') for name in ['E6', 'E2', 'E5', 'E1', 'E4', 'E3']]
+        ]
+        events = pd.DataFrame(rows, columns=['user_identity', 'hour', 'event_name', 'resource_type'])
+        events = events.iloc[np.random.default_rng(0).permutation(len(events))].reset_index(drop=True)
+        events['timestamp'] = pd.Timestamp('2024-01-01') + pd.to_timedelta(events.index, unit='D')
+        
+        categorical = events.astype({col: 'category' for col in ['user_identity', 'event_name', 'resource_type']})
+        for frame in (events, categorical):
+            self.detector.behavioral_profiles = {}
+            self.detector.update_behavioral_profiles(frame)
+            
+            for user in ['user1', 'user2']:
+                user_data = frame[frame['user_identity'] == user]
+                profile = self.detector.behavioral_profiles[user]
+                
+                self.assertEqual(profile['usual_hours'], user_data['hour'].mode().iloc[0])
+                for key, column in [('common_events', 'event_name'), ('common_resources', 'resource_type')]:
+                    counts = user_data[column].value_counts()
+                    expected = counts[counts > 0].head(5)
+                    self.assertEqual(list(profile[key].items()), list(expected.items()))
+
+class CustomIntelAnalyzer(ThreatAnalyzer):
+    def load_threat_intelligence(self):
+        intel = super().load_threat_intelligence()
+        intel['known_malicious_ips'] = intel['known_malicious_ips'] | {'203.0.113.7'}
+        intel['suspicious_user_agents'] = intel['suspicious_user_agents'] + ('masscan',)
+        return intel
 
 class TestThreatAnalyzer(unittest.TestCase):
     def setUp(self):
@@ -67,6 +170,99 @@ class TestThreatAnalyzer(unittest.TestCase):
         report = self.analyzer.generate_threat_report(analysis)
         self.assertIsInstance(report, str)
         self.assertIn('THREAT INTELLIGENCE REPORT', report)
+    
+    def test_empty_events(self):
+        """Test that an empty batch yields a complete, reportable analysis"""
+        analysis = self.analyzer.analyze_events(pd.DataFrame())
+        self.assertEqual(analysis['threats_detected'], 0)
+        self.assertEqual(analysis['high_severity_threats'], 0)
+        self.assertIn('analysis_timestamp', analysis)
+        self.assertIn('THREAT INTELLIGENCE REPORT', self.analyzer.generate_threat_report(analysis))
+    
+    def test_overridden_threat_intelligence(self):
+        """Test that subclass intel drives the vectorized indicator matching"""
+        events = pd.DataFrame({
+            'event_name': ['DescribeInstances'],
+            'user_identity': ['user1'],
+            'source_ip': ['203.0.113.7'],
+            'user_agent': ['masscan/1.3'],
+            'timestamp': [datetime.now()]
+        })
+        
+        results = CustomIntelAnalyzer().analyze_events(events)
+        threat_types = {threat.threat_type for threat in results['threats']}
+        self.assertEqual(threat_types, {'known_malicious_ip', 'suspicious_user_agent'})
+        
+        # The stock intel is unaffected by the subclass
+        self.assertEqual(ThreatAnalyzer().analyze_events(events)['threats_detected'], 0)
+    
+    def test_threat_intelligence_isolated_between_instances(self):
+        """Test that modifying one analyzer's intel leaves new analyzers intact"""
+        self.analyzer.threat_intelligence['critical_operations'] = frozenset()
+        self.analyzer.suspicious_patterns[0]['severity'] = 'LOW'
+        
+        analyzer = ThreatAnalyzer()
+        self.assertIn('CreateUser', analyzer.threat_intelligence['critical_operations'])
+        self.assertEqual(analyzer.suspicious_patterns[0]['severity'], 'HIGH')
+    
+    def test_ipv4_packing(self):
+        """Test that only canonical dotted-quad IPv4 strings are packed"""
+        packed, valid = _ipv4_to_uint32([
+            '10.0.0.50', '0.0.0.0', '255.255.255.255',
+            '10.0.0.050', '256.1.1.1', '10.0.0.50\n', '10.0.0', None, np.nan
+        ])
+        self.assertEqual(valid.tolist(), [True, True, True, False, False, False, False, False, False])
+        self.assertEqual(packed[:3].tolist(), [(10 << 24) + 50, 0, 2**32 - 1])
+    
+    def test_malicious_ip_matching(self):
+        """Test that malicious IPs match exactly, including non-IPv4 intel"""
+        class IPv6IntelAnalyzer(ThreatAnalyzer):
+            def load_threat_intelligence(self):
+                intel = super().load_threat_intelligence()
+                intel['known_malicious_ips'] = intel['known_malicious_ips'] | {'2001:db8::1'}
+                return intel
+        
+        events = pd.DataFrame({
+            'source_ip': ['10.0.0.50', '10.0.0.050', '10.0.0.50\n', None, np.nan, '2001:db8::1', '300.0.0.50']
+        })
+        matches = IPv6IntelAnalyzer().match_single_event_indicators(events)
+        self.assertEqual(matches.tolist(), [True, False, False, False, False, True, False])
+        
+        # Categorical columns take the same path
+        events['source_ip'] = events['source_ip'].astype('category')
+        matches = IPv6IntelAnalyzer().match_single_event_indicators(events)
+        self.assertEqual(matches.tolist(), [True, False, False, False, False, True, False])
+
+class TestRealTimeThreatMonitor(unittest.TestCase):
+    def setUp(self):
+        self.monitor = RealTimeThreatMonitor(ThreatAnalyzer())
+        self.monitor.threat_history = deque(maxlen=3)
+    
+    def make_batch(self, n_malicious, n_scanners):
+        """Build a batch with HIGH (malicious IP) and MEDIUM (scanner) threats"""
+        n = n_malicious + n_scanners
+        return pd.DataFrame({
+            'event_name': ['DescribeInstances'] * n,
+            'source_ip': ['192.168.1.100'] * n_malicious + ['192.168.1.2'] * n_scanners,
+            'user_agent': ['Mozilla/5.0'] * n_malicious + ['nmap'] * n_scanners
+        })
+    
+    def test_running_totals_after_eviction(self):
+        """Test that cached totals match a fresh sum once old batches are evicted"""
+        batches = [(1, 0), (0, 2), (3, 1), (0, 0), (2, 2), (4, 0), (1, 3)]
+        for n_malicious, n_scanners in batches:
+            if n_malicious + n_scanners:
+                self.monitor.monitor_events(self.make_batch(n_malicious, n_scanners))
+            else:
+                self.monitor.monitor_events(pd.DataFrame())
+            
+            analyses = [item['analysis'] for item in self.monitor.threat_history]
+            metrics = self.monitor.get_threat_metrics()
+            self.assertEqual(metrics['total_threats_detected'], sum(a['threats_detected'] for a in analyses))
+            self.assertEqual(metrics['high_severity_threats'], sum(a['high_severity_threats'] for a in analyses))
+        
+        self.assertEqual(len(self.monitor.threat_history), 3)
+        self.assertEqual(self.monitor.get_threat_metrics()['total_threats_detected'], 4 + 4 + 4)
 
 if __name__ == '__main__':
     unittest.main()